@@ -1,7 +1,7 @@
 #!/usr/bin/env -S uv run
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["streamlit", "plotly", "pandas", "duckdb"]
+# dependencies = ["streamlit", "plotly", "pandas", "numpy", "duckdb"]
 # ///
 
 try:
@@ -19,7 +19,14 @@ except Exception:
     except KeyboardInterrupt:
         sys.exit(130)
 
+import glob
+import os
+import re
+import time
+
 import duckdb
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
@@ -28,24 +35,8 @@ st.set_page_config(page_title="MotherDuck Scale Test", layout="wide")
 st.title("MotherDuck Scale Test Dashboard")
 
 LOGS_GLOB = "./logs/**/*.json"
-
-# Load all runs (ignore_errors to skip malformed JSON)
-try:
-    all_data = duckdb.sql(
-        f"SELECT * FROM read_json_auto('{LOGS_GLOB}', ignore_errors=true, union_by_name=true)"
-    ).fetchdf()
-except Exception as e:
-    st.error(f"No data found. Run `./test-scale.sh` first.\n\n{e}")
-    st.stop()
-
-if all_data.empty:
-    st.warning("No log files found in ./logs/")
-    st.stop()
-
-# Ensure new columns exist for backward compat with old runs
-for col in ["select2_ms", "select3_ms"]:
-    if col not in all_data.columns:
-        all_data[col] = None
+# Parsed logs, so JSON is only deserialized once per file
+LOGS_CACHE = "./logs/_cache.parquet"
 
 STEP_COLS = [
     "create_sa_ms",
@@ -67,91 +58,35 @@ STEP_LABELS = {
     "pragma_ms": "PRAGMA",
     "cleanup_ms": "Cleanup",
 }
-
-# Sidebar: run picker
-runs = sorted(all_data["run_id"].unique(), reverse=True)
-run_labels = {
-    r: f"{r} ({len(all_data[all_data['run_id'] == r])} workers)" for r in runs
-}
-
-st.sidebar.header("Run selection")
-selected_run = st.sidebar.selectbox(
-    "Run",
-    runs,
-    index=0,
-    format_func=lambda r: run_labels[r],
-)
-compare_run = st.sidebar.selectbox(
-    "Compare with",
-    [None] + [r for r in runs if r != selected_run],
-    index=0,
-    format_func=lambda r: run_labels[r] if r else "None",
-)
-
-df = all_data[all_data["run_id"] == selected_run].copy().sort_values("worker")
-n_workers = len(df)
-n_passed = len(df[df["status"] == "success"])
-n_failed = len(df[df["status"] == "failed"])
-
-# Top-line metrics
-st.subheader("Summary")
-cols = st.columns(6)
-cols[0].metric("Workers", n_workers)
-cols[1].metric("Passed", n_passed)
-cols[2].metric(
-    "Failed",
-    n_failed,
-    delta=f"-{n_failed}" if n_failed else None,
-    delta_color="inverse",
-)
-cols[3].metric("Avg Total", f"{df['total_ms'].mean():.0f}ms")
-cols[4].metric("p50 Total", f"{df['total_ms'].quantile(0.5):.0f}ms")
-cols[5].metric("p95 Total", f"{df['total_ms'].quantile(0.95):.0f}ms")
-
-# Percentile table
-st.subheader("Latency percentiles (ms)")
-percentiles = [0.25, 0.50, 0.75, 0.90, 0.95, 0.99, 1.0]
-perc_data = {}
-for col in ["total_ms"] + STEP_COLS:
-    valid = df[col].dropna()
-    if valid.empty:
-        continue
-    label = STEP_LABELS.get(col, "Total")
-    perc_data[label] = {
-        "min": valid.min(),
-        **{f"p{int(p * 100)}": valid.quantile(p) for p in percentiles},
-        "mean": valid.mean(),
-    }
-perc_df = (
-    __import__("pandas")
-    .DataFrame(perc_data)
-    .T.rename(columns={"p100": "max"})
-    .round(0)
-    .astype(int)
-)
-st.dataframe(perc_df, width="stretch")
-
-# Worker outcome by index
-st.subheader("Pass / fail by worker index")
-status_color = (
-    df["status"].map({"success": "#2ecc71", "failed": "#e74c3c"}).fillna("#95a5a6")
-)
-fig_outcome = go.Figure()
-fig_outcome.add_trace(
-    go.Bar(
-        x=df["worker"],
-        y=[1] * len(df),
-        marker_color=status_color,
-        hovertext=df.apply(
-            lambda r: (
-                f"Worker {int(r['worker'])}: {r['status']}"
-                + (f"\n{r['error']}" if r.get("error") else "")
-            ),
-            axis=1,
-        ),
-        hoverinfo="text",
+STEP_COLORS = dict(
+    zip(
+        STEP_COLS,
+        [
+            "#3498db",
+            "#9b59b6",
+            "#e67e22",
+            "#e74c3c",
+            "#c0392b",
+            "#d35400",
+            "#1abc9c",
+            "#95a5a6",
+        ],
     )
 )
+# Fixed schema so DuckDB doesn't read every file to infer one; keys missing
+# from older runs (select2_ms, select3_ms) load as NULL
+LOG_COLUMNS = {
+    "worker": "BIGINT",
+    "service_account": "VARCHAR",
+    "run_id": "BIGINT",
+    "status": "VARCHAR",
+    "error": "VARCHAR",
+    "total_ms": "BIGINT",
+    **{col: "BIGINT" for col in STEP_COLS},
+}
+STATUS_COLORS = {"success": "#2ecc71", "failed": "#e74c3c"}
+PERCENTILES = [0.25, 0.50, 0.75, 0.90, 0.95, 0.99, 1.0]
+
 # Determine which step failed from the error message
 ERROR_PREFIX_TO_STEP = {
     "create service account": "Create SA",
@@ -166,359 +101,767 @@ ERROR_PREFIX_TO_STEP = {
 }
 
 
-def detect_failed_step(error: str) -> str:
-    if not error:
-        return ""
-    for prefix, step in ERROR_PREFIX_TO_STEP.items():
-        if prefix in error:
-            return step
-    return error[:40]
+# Single alternation over every prefix; the matched text is the map key, and
+# unmatched errors fall back to their first 40 characters ('' for a NULL error,
+# so every failure is counted)
+ERROR_PREFIX_PATTERN = "|".join(map(re.escape, ERROR_PREFIX_TO_STEP))
+ERROR_PREFIX_MAP = ", ".join(f"'{k}': '{v}'" for k, v in ERROR_PREFIX_TO_STEP.items())
+FAILED_STEP_SQL = f"""COALESCE(
+    MAP {{{ERROR_PREFIX_MAP}}}[regexp_extract(error, '{ERROR_PREFIX_PATTERN}')],
+    left(COALESCE(error, ''), 40)
+)"""
+
+
+def refresh_logs_cache(con: duckdb.DuckDBPyConnection) -> None:
+    """Sync the Parquet cache with the log files currently on disk."""
+    columns = ", ".join(f"'{name}': '{dtype}'" for name, dtype in LOG_COLUMNS.items())
+    # ignore_errors to skip malformed JSON; filename lets a rewritten file
+    # replace its old rows
+    read_opts = (
+        f"columns={{{columns}}}, format='auto', ignore_errors=true, filename=true"
+    )
+    started = time.time()
+    source = None
+    params = []
+    cache_cols = set()
+    if os.path.exists(LOGS_CACHE):
+        cache_cols = {
+            row[0]
+            for row in con.execute(
+                f"DESCRIBE SELECT * FROM read_parquet('{LOGS_CACHE}')"
+            ).fetchall()
+        }
+    if not LOG_COLUMNS.keys() <= cache_cols:
+        # No cache yet, or one written before the current schema
+        source = f"SELECT * FROM read_json('{LOGS_GLOB}', {read_opts})"
+    else:
+        cached_at = os.path.getmtime(LOGS_CACHE)
+        on_disk = set(glob.glob(LOGS_GLOB, recursive=True))
+        cached = {
+            row[0]
+            for row in con.execute(
+                f"SELECT DISTINCT filename FROM read_parquet('{LOGS_CACHE}')"
+            ).fetchall()
+        }
+        # Files not cached yet (including ones copied in with an old mtime) or
+        # rewritten since the last refresh
+        to_load = sorted(
+            f for f in on_disk if f not in cached or os.path.getmtime(f) > cached_at
+        )
+        # Drop rows of deleted files and of files about to be re-read
+        stale = sorted((cached - on_disk) | set(to_load))
+        if stale:
+            source = f"""
+                SELECT * FROM read_parquet('{LOGS_CACHE}')
+                WHERE NOT list_contains(?, filename)
+            """
+            params = [stale]
+        if to_load:
+            con.execute(
+                f"CREATE OR REPLACE TEMP TABLE new_logs AS SELECT * FROM read_json(?, {read_opts})",
+                [to_load],
+            )
+            source += """
+                UNION ALL BY NAME
+                SELECT * FROM new_logs
+            """
+    if source is not None:
+        tmp_path = f"{LOGS_CACHE}.tmp"
+        con.execute(f"COPY ({source}) TO '{tmp_path}' (FORMAT PARQUET)", params)
+        os.replace(tmp_path, LOGS_CACHE)
+        # Stamp with the scan start so files written during the rebuild are
+        # picked up next time
+        os.utime(LOGS_CACHE, (started, started))
+
+
+@st.cache_resource
+def get_con() -> duckdb.DuckDBPyConnection:
+    """Connection with the `logs` view registered once per server process."""
+    con = duckdb.connect(":memory:")
+    # Cap memory so a large ./logs/ can't OOM the host, and keep Parquet footers
+    # cached across queries against the same cache file
+    con.execute("SET memory_limit = '2GB'")
+    con.execute("SET parquet_metadata_cache = true")
+    refresh_logs_cache(con)
+    con.execute(
+        f"CREATE OR REPLACE VIEW logs AS SELECT * EXCLUDE (filename) FROM read_parquet('{LOGS_CACHE}')"
+    )
+    return con
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def sync_logs_cache() -> None:
+    refresh_logs_cache(get_con().cursor())
 
 
-df["failed_step"] = df.apply(
-    lambda r: detect_failed_step(r["error"]) if r["status"] == "failed" else "",
-    axis=1,
-)
-fig_outcome.update_layout(
-    yaxis=dict(visible=False, range=[0, 1.2]),
-    xaxis_title="Worker #",
-    bargap=0,
-    height=150,
-    margin=dict(t=10, b=40, l=40, r=20),
-    showlegend=False,
-)
-st.plotly_chart(fig_outcome, width="stretch")
+# Queries go through a per-call cursor (the shared connection is not safe to use
+# from several sessions at once) and are cached so widget reruns skip the scan.
+@st.cache_data(ttl=60)
+def load_runs() -> list[tuple[int, int]]:
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT run_id, COUNT(*) FROM logs GROUP BY run_id ORDER BY run_id DESC"
+        )
+        .fetchall()
+    )
+
 
-if n_failed > 0:
-    # Show which step each failure occurred at
-    fail_step_counts = (
-        df[df["status"] == "failed"]["failed_step"].value_counts().reset_index()
+@st.cache_data(ttl=60)
+def load_run(run_id: int) -> pd.DataFrame:
+    return (
+        get_con()
+        .cursor()
+        .execute("SELECT * FROM logs WHERE run_id = ? ORDER BY worker", [run_id])
+        .fetchdf()
+        # Categorical so status comparisons and counts work on int codes
+        .astype({"status": "category"})
     )
-    fail_step_counts.columns = ["Failed at step", "Count"]
-    fc1, fc2 = st.columns([1, 2])
-    with fc1:
-        st.dataframe(fail_step_counts, hide_index=True, width="stretch")
-    with fc2:
-        # Cumulative failure rate by worker index
-        df_sorted = df.sort_values("worker")
-        df_sorted["cum_failures"] = (df_sorted["status"] == "failed").cumsum()
-        df_sorted["cum_fail_pct"] = (
-            df_sorted["cum_failures"] / (df_sorted.index.values + 1) * 100
+
+
+@st.cache_data(ttl=60)
+def load_failures(run_id: int) -> pd.DataFrame:
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            f"""
+            SELECT worker, service_account, error, total_ms,
+                {FAILED_STEP_SQL} AS failed_step
+            FROM logs
+            WHERE run_id = ? AND status = 'failed'
+            ORDER BY worker
+            """,
+            [run_id],
         )
-        # Recompute using position
-        positions = range(1, len(df_sorted) + 1)
-        cum_fail_pct = [
-            df_sorted.iloc[:i]["status"].eq("failed").sum() / i * 100 for i in positions
-        ]
-        fig_cum = go.Figure(
-            go.Scatter(
-                x=df_sorted["worker"],
-                y=cum_fail_pct,
-                mode="lines",
-                fill="tozeroy",
-                line=dict(color="#e74c3c"),
-            )
+        .fetchdf()
+    )
+
+
+@st.cache_data(ttl=60)
+def load_summary(run_id: int) -> tuple:
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT AVG(total_ms), QUANTILE_CONT(total_ms, [0.5, 0.95]) FROM logs WHERE run_id = ?",
+            [run_id],
         )
-        fig_cum.update_layout(
-            xaxis_title="Worker #",
-            yaxis_title="Cumulative failure %",
-            height=250,
-            margin=dict(t=10, b=40),
+        .fetchone()
+    )
+
+
+@st.cache_data(ttl=60)
+def load_step_counts(run_id: int) -> dict[str, int]:
+    """Non-null value count per step, to skip empty steps without touching the frame."""
+    row = (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT "
+            + ", ".join(f"COUNT({col})" for col in STEP_COLS)
+            + " FROM logs WHERE run_id = ?",
+            [run_id],
         )
-        st.plotly_chart(fig_cum, width="stretch")
-
-# Charts row 1: total latency distribution + per-step avg breakdown
-c1, c2 = st.columns(2)
-
-with c1:
-    st.subheader("Total latency distribution")
-    fig_hist = px.histogram(
-        df,
-        x="total_ms",
-        nbins=30,
-        color="status",
-        color_discrete_map={"success": "#2ecc71", "failed": "#e74c3c"},
-        labels={"total_ms": "Total (ms)", "count": "Workers"},
+        .fetchone()
     )
-    fig_hist.update_layout(bargap=0.05, showlegend=True)
-    st.plotly_chart(fig_hist, width="stretch")
-
-with c2:
-    st.subheader("Average time per step")
-    step_avgs = {}
-    step_colors_used = []
-    step_color_map = dict(
-        zip(
-            STEP_COLS,
-            [
-                "#3498db",
-                "#9b59b6",
-                "#e67e22",
-                "#e74c3c",
-                "#c0392b",
-                "#d35400",
-                "#1abc9c",
-                "#95a5a6",
-            ],
+    return dict(zip(STEP_COLS, row))
+
+
+@st.cache_data(ttl=60)
+def load_step_averages(run_id: int) -> tuple:
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT "
+            + ", ".join(f"AVG({col})" for col in STEP_COLS)
+            + " FROM logs WHERE run_id = ?",
+            [run_id],
         )
+        .fetchone()
     )
-    for c in STEP_COLS:
-        v = df[c].dropna()
-        if not v.empty:
-            step_avgs[STEP_LABELS[c]] = v.mean()
-            step_colors_used.append(step_color_map[c])
-    fig_bar = go.Figure(
-        go.Bar(
-            x=list(step_avgs.values()),
-            y=list(step_avgs.keys()),
-            orientation="h",
-            marker_color=step_colors_used,
-            text=[f"{v:.0f}ms" for v in step_avgs.values()],
-            textposition="auto",
+
+
+@st.cache_data(ttl=60)
+def load_percentiles(run_id: int) -> tuple:
+    # One scan computes min / quantiles / mean for every column
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT "
+            + ", ".join(
+                f"MIN({col}), QUANTILE_CONT({col}, {PERCENTILES}), AVG({col})"
+                for col in ["total_ms"] + STEP_COLS
+            )
+            + " FROM logs WHERE run_id = ?",
+            [run_id],
         )
+        .fetchone()
     )
-    fig_bar.update_layout(xaxis_title="ms", yaxis=dict(autorange="reversed"))
-    st.plotly_chart(fig_bar, width="stretch")
 
-# Charts row 2: per-step box plots + worker scatter
-c3, c4 = st.columns(2)
 
-with c3:
-    st.subheader("Step latency distributions")
-    melted = (
-        df[STEP_COLS].rename(columns=STEP_LABELS).melt(var_name="Step", value_name="ms")
+@st.cache_data(ttl=60)
+def load_histogram(run_id: int) -> pd.DataFrame:
+    """Worker counts per status over ~30 equal-width total_ms bins."""
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            """
+            WITH bins AS (
+                SELECT equi_width_bins(MIN(total_ms), MAX(total_ms), 30, true) AS b
+                FROM logs
+                WHERE run_id = $run
+            ),
+            hist AS (
+                SELECT status, histogram(total_ms, (SELECT b FROM bins)) AS h
+                FROM logs
+                WHERE run_id = $run
+                GROUP BY status
+            )
+            SELECT
+                status,
+                UNNEST(map_keys(h)) AS bin_end,
+                UNNEST(map_values(h)) AS workers
+            FROM hist
+            """,
+            {"run": run_id},
+        )
+        .fetchdf()
     )
-    melted = melted.dropna()
-    step_order = list(STEP_LABELS.values())
-    fig_box = px.box(
-        melted,
-        x="Step",
-        y="ms",
-        color="Step",
-        category_orders={"Step": step_order},
+
+
+@st.cache_data(ttl=60)
+def load_step_buckets(run_id: int, bin_size: int) -> pd.DataFrame:
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT worker // $bin * $bin AS bucket, "
+            + ", ".join(f"AVG({col}) AS {col}" for col in STEP_COLS)
+            + " FROM logs WHERE run_id = $run GROUP BY bucket ORDER BY bucket",
+            {"bin": bin_size, "run": run_id},
+        )
+        .fetchdf()
     )
-    fig_box.update_layout(showlegend=False, yaxis_title="ms")
-    st.plotly_chart(fig_box, width="stretch")
-
-with c4:
-    st.subheader("Latency by worker index")
-    fig_scatter = px.scatter(
-        df,
-        x="worker",
-        y="total_ms",
-        color="status",
-        color_discrete_map={"success": "#2ecc71", "failed": "#e74c3c"},
-        labels={"worker": "Worker #", "total_ms": "Total (ms)"},
-        hover_data=STEP_COLS,
+
+
+@st.cache_data(ttl=60)
+def load_comparison(run_id: int, compare_run: int) -> dict[int, dict]:
+    """p50/p95 of every column for both runs, keyed by run then column."""
+    cols = ["total_ms"] + STEP_COLS
+    cur = (
+        get_con()
+        .cursor()
+        .execute(
+            "SELECT run_id, "
+            + ", ".join(f"QUANTILE_CONT({col}, [0.5, 0.95])" for col in cols)
+            + " FROM logs WHERE run_id IN (?, ?) GROUP BY run_id",
+            [run_id, compare_run],
+        )
     )
-    fig_scatter.update_layout(showlegend=True)
-    st.plotly_chart(fig_scatter, width="stretch")
-
-# Stacked bar: per-worker step breakdown
-st.subheader("Per-worker step breakdown")
-fig_stacked = go.Figure()
-colors = [
-    "#3498db",
-    "#9b59b6",
-    "#e67e22",
-    "#e74c3c",
-    "#c0392b",
-    "#d35400",
-    "#1abc9c",
-    "#95a5a6",
-]
-for col, color in zip(STEP_COLS, colors):
-    fig_stacked.add_trace(
+    return {row[0]: dict(zip(cols, row[1:])) for row in cur.fetchall()}
+
+
+@st.cache_data(ttl=60)
+def load_trends() -> pd.DataFrame:
+    # One grouped scan over every run; quantile lists are unpacked into columns
+    return (
+        get_con()
+        .cursor()
+        .execute(
+            """
+            SELECT
+                run_id,
+                workers,
+                pass_rate,
+                total_q[1] AS p50_total,
+                total_q[2] AS p95_total,
+                select1_q[1] AS p50_select1,
+                select1_q[2] AS p95_select1,
+                select3_q[1] AS p50_select3,
+                select3_q[2] AS p95_select3
+            FROM (
+                SELECT
+                    run_id,
+                    COUNT(*) AS workers,
+                    AVG((status = 'success')::INT) * 100 AS pass_rate,
+                    QUANTILE_CONT(total_ms, [0.5, 0.95]) AS total_q,
+                    QUANTILE_CONT(select1_ms, [0.5, 0.95]) AS select1_q,
+                    QUANTILE_CONT(select3_ms, [0.5, 0.95]) AS select3_q
+                FROM logs
+                GROUP BY run_id
+            )
+            ORDER BY run_id
+            """
+        )
+        .fetchdf()
+    )
+
+
+def fast_plot(fig: go.Figure) -> None:
+    """Render a figure at full container width.
+
+    The Figure is passed as-is: Streamlit serializes it with validate=False,
+    whereas a plain dict would be re-validated by building a new Figure.
+    """
+    # _validate=False skips coercing title="..." to {"text": ...}, and plotly.js
+    # v3 drops bare string titles, so use the *_title_text= forms
+    layout = fig.layout.to_plotly_json()
+    for name, part in [("layout", layout), *layout.items()]:
+        if isinstance(part, dict) and isinstance(part.get("title"), str):
+            raise ValueError(f"{name} title must be a dict, got {part['title']!r}")
+    st.plotly_chart(fig, width="stretch")
+
+
+def render_summary(run_id: int, df: pd.DataFrame) -> None:
+    """Top-line metrics."""
+    n_workers = len(df)
+    n_passed = int((df["status"] == "success").sum())
+    n_failed = int((df["status"] == "failed").sum())
+    st.subheader("Summary")
+    cols = st.columns(6)
+    cols[0].metric("Workers", n_workers)
+    cols[1].metric("Passed", n_passed)
+    cols[2].metric(
+        "Failed",
+        n_failed,
+        delta=f"-{n_failed}" if n_failed else None,
+        delta_color="inverse",
+    )
+    avg_total, (p50_total, p95_total) = load_summary(run_id)
+    cols[3].metric("Avg Total", f"{avg_total:.0f}ms")
+    cols[4].metric("p50 Total", f"{p50_total:.0f}ms")
+    cols[5].metric("p95 Total", f"{p95_total:.0f}ms")
+
+
+def render_percentiles(run_id: int) -> None:
+    """Percentile table."""
+    st.subheader("Latency percentiles (ms)")
+    perc_row = load_percentiles(run_id)
+    perc_data = {}
+    for i, col in enumerate(["total_ms"] + STEP_COLS):
+        col_min, col_quantiles, col_mean = perc_row[3 * i : 3 * i + 3]
+        if col_quantiles is None:
+            continue
+        label = STEP_LABELS.get(col, "Total")
+        perc_data[label] = {
+            "min": col_min,
+            **{f"p{int(p * 100)}": q for p, q in zip(PERCENTILES, col_quantiles)},
+            "mean": col_mean,
+        }
+    perc_df = (
+        pd.DataFrame(perc_data).T.rename(columns={"p100": "max"}).round(0).astype(int)
+    )
+    st.dataframe(perc_df, width="stretch")
+
+
+def render_outcome(df: pd.DataFrame, failed_df: pd.DataFrame) -> None:
+    """Worker outcome by index."""
+    st.subheader("Pass / fail by worker index")
+    # Index a small palette with per-row codes (0 other, 1 failed, 2 success)
+    codes = (df["status"] == "failed").to_numpy(np.int8)
+    codes += (df["status"] == "success").to_numpy(np.int8) * 2
+    palette = np.array(["#95a5a6", STATUS_COLORS["failed"], STATUS_COLORS["success"]])
+    status_color = palette[codes]
+    error = df["error"].fillna("")
+    fig_outcome = go.Figure(_validate=False)
+    fig_outcome.add_trace(
         go.Bar(
-            name=STEP_LABELS[col],
             x=df["worker"],
-            y=df[col],
-            marker_color=color,
+            y=[1] * len(df),
+            marker_color=status_color,
+            hovertext="Worker "
+            + df["worker"].astype(str)
+            + ": "
+            + df["status"].astype(str)
+            + np.where(error != "", "\n" + error, ""),
+            hoverinfo="text",
+            _validate=False,
         )
     )
-fig_stacked.update_layout(
-    barmode="stack",
-    xaxis_title="Worker #",
-    yaxis_title="ms",
-    legend=dict(orientation="h", y=1.12),
-)
-st.plotly_chart(fig_stacked, width="stretch")
+    fig_outcome.update_layout(
+        yaxis=dict(visible=False, range=[0, 1.2]),
+        xaxis_title_text="Worker #",
+        bargap=0,
+        height=150,
+        margin=dict(t=10, b=40, l=40, r=20),
+        showlegend=False,
+    )
+    fast_plot(fig_outcome)
+
+    if not failed_df.empty:
+        # Show which step each failure occurred at
+        fail_step_counts = failed_df["failed_step"].value_counts().reset_index()
+        fail_step_counts.columns = ["Failed at step", "Count"]
+        fc1, fc2 = st.columns([1, 2])
+        with fc1:
+            st.dataframe(fail_step_counts, hide_index=True, width="stretch")
+        with fc2:
+            # Cumulative failure rate by worker index
+            df_sorted = df.sort_values("worker")
+            is_failed = (df_sorted["status"] == "failed").to_numpy()
+            cum_fail_pct = is_failed.cumsum() / np.arange(1, len(df_sorted) + 1) * 100
+            fig_cum = go.Figure(
+                go.Scatter(
+                    x=df_sorted["worker"],
+                    y=cum_fail_pct,
+                    mode="lines",
+                    fill="tozeroy",
+                    line=dict(color="#e74c3c"),
+                    _validate=False,
+                ),
+                _validate=False,
+            )
+            fig_cum.update_layout(
+                xaxis_title_text="Worker #",
+                yaxis_title_text="Cumulative failure %",
+                height=250,
+                margin=dict(t=10, b=40),
+            )
+            fast_plot(fig_cum)
+
+
+def render_latency_charts(run_id: int, df: pd.DataFrame) -> None:
+    """Latency distribution, per-step and per-worker charts."""
+    # Charts row 1: total latency distribution + per-step avg breakdown
+    c1, c2 = st.columns(2)
+
+    with c1:
+        st.subheader("Total latency distribution")
+        hist = load_histogram(run_id)
+        bin_ends = np.sort(hist["bin_end"].unique())
+        bin_width = bin_ends[1] - bin_ends[0] if len(bin_ends) > 1 else 0
+        fig_hist = go.Figure(_validate=False)
+        for status, sdf in hist.groupby("status", sort=False):
+            fig_hist.add_trace(
+                go.Bar(
+                    x=sdf["bin_end"] - bin_width / 2,
+                    y=sdf["workers"],
+                    name=status,
+                    marker_color=STATUS_COLORS.get(status, "#95a5a6"),
+                    _validate=False,
+                )
+            )
+        fig_hist.update_layout(
+            barmode="stack",
+            bargap=0.05,
+            xaxis_title_text="Total (ms)",
+            yaxis_title_text="Workers",
+            legend_title_text="status",
+            showlegend=True,
+        )
+        fast_plot(fig_hist)
+
+    with c2:
+        st.subheader("Average time per step")
+        step_avgs = {}
+        step_colors_used = []
+        for c, avg in zip(STEP_COLS, load_step_averages(run_id)):
+            if avg is not None:
+                step_avgs[STEP_LABELS[c]] = avg
+                step_colors_used.append(STEP_COLORS[c])
+        fig_bar = go.Figure(
+            go.Bar(
+                x=list(step_avgs.values()),
+                y=list(step_avgs.keys()),
+                orientation="h",
+                marker_color=step_colors_used,
+                text=[f"{v:.0f}ms" for v in step_avgs.values()],
+                textposition="auto",
+                _validate=False,
+            ),
+            _validate=False,
+        )
+        fig_bar.update_layout(xaxis_title_text="ms", yaxis=dict(autorange="reversed"))
+        fast_plot(fig_bar)
+
+    # Charts row 2: per-step box plots + worker scatter
+    c3, c4 = st.columns(2)
+
+    with c3:
+        st.subheader("Step latency distributions")
+        # One trace per step straight from its column, no long-format copy
+        fig_box = go.Figure(_validate=False)
+        step_counts = load_step_counts(run_id)
+        for col, color in STEP_COLORS.items():
+            if step_counts[col]:
+                fig_box.add_trace(
+                    go.Box(
+                        y=df[col].dropna().to_numpy(),
+                        name=STEP_LABELS[col],
+                        marker_color=color,
+                        _validate=False,
+                    )
+                )
+        fig_box.update_layout(showlegend=False, yaxis_title_text="ms")
+        fast_plot(fig_box)
+
+    with c4:
+        st.subheader("Latency by worker index")
+        # WebGL traces keep large runs responsive (SVG draws one DOM node per point)
+        fig_scatter = go.Figure(_validate=False)
+        for status, sdf in df.groupby("status", sort=False, observed=True):
+            fig_scatter.add_trace(
+                go.Scattergl(
+                    x=sdf["worker"],
+                    y=sdf["total_ms"],
+                    mode="markers",
+                    name=status,
+                    marker=dict(color=STATUS_COLORS.get(status, "#95a5a6")),
+                    customdata=sdf[STEP_COLS],
+                    hovertemplate="Worker #=%{x}<br>Total (ms)=%{y}"
+                    + "".join(
+                        f"<br>{c}=%{{customdata[{i}]}}" for i, c in enumerate(STEP_COLS)
+                    )
+                    + "<extra></extra>",
+                    _validate=False,
+                )
+            )
+        fig_scatter.update_layout(
+            xaxis_title_text="Worker #",
+            yaxis_title_text="Total (ms)",
+            legend_title_text="status",
+            showlegend=True,
+        )
+        fast_plot(fig_scatter)
+
+
+def render_step_breakdown(run_id: int, n_workers: int) -> None:
+    """Stacked bar: per-worker step breakdown."""
+    st.subheader("Per-worker step breakdown")
+    # Average workers into at most 200 buckets so large runs stay cheap to draw
+    bin_size = max(1, -(-n_workers // 200))
+    buckets = load_step_buckets(run_id, bin_size)
+    step_counts = load_step_counts(run_id)
+    fig_stacked = go.Figure(_validate=False)
+    for col, color in STEP_COLORS.items():
+        if not step_counts[col]:
+            continue
+        fig_stacked.add_trace(
+            go.Bar(
+                name=STEP_LABELS[col],
+                x=buckets["bucket"],
+                y=buckets[col],
+                marker_color=color,
+                _validate=False,
+            )
+        )
+    x_title = "Worker #" if bin_size == 1 else f"Worker # (avg per {bin_size})"
+    fig_stacked.update_layout(
+        barmode="stack",
+        xaxis_title_text=x_title,
+        yaxis_title_text="ms",
+        legend=dict(orientation="h", y=1.12),
+    )
+    fast_plot(fig_stacked)
+
 
-# Failures detail
-if n_failed > 0:
+def render_failures(failed_df: pd.DataFrame) -> None:
+    """Failures detail."""
+    if failed_df.empty:
+        return
     st.subheader("Failures")
-    failed_df = df[df["status"] == "failed"][
-        ["worker", "service_account", "error", "total_ms"]
-    ]
-    st.dataframe(failed_df, width="stretch", hide_index=True)
+    st.dataframe(
+        failed_df[["worker", "service_account", "error", "total_ms"]],
+        width="stretch",
+        hide_index=True,
+    )
 
     fail_reasons = failed_df["error"].value_counts().reset_index()
     fail_reasons.columns = ["Error", "Count"]
     fig_fail = px.bar(fail_reasons, x="Count", y="Error", orientation="h")
-    st.plotly_chart(fig_fail, width="stretch")
-
-# Cross-run comparison
-if compare_run:
-    st.divider()
-    st.subheader(f"Comparison: {selected_run} vs {compare_run}")
-    df2 = all_data[all_data["run_id"] == compare_run].copy()
-
-    comp_items = [("Total", "total_ms")] + [(STEP_LABELS[c], c) for c in STEP_COLS]
-    comp_cols = st.columns(len(comp_items))
-    for i, (label, col) in enumerate(comp_items):
-        curr = df[col].dropna()
-        prev = df2[col].dropna()
-        if curr.empty:
-            comp_cols[i].metric(f"{label} (p50)", "n/a")
-            continue
-        curr_med = curr.median()
-        delta_str = None
-        if not prev.empty:
-            delta_str = f"{curr_med - prev.median():+.0f}ms"
-        comp_cols[i].metric(
-            f"{label} (p50)",
-            f"{curr_med:.0f}ms",
-            delta=delta_str,
-            delta_color="inverse",
-        )
+    fast_plot(fig_fail)
 
-    comp_data = []
-    for col in ["total_ms"] + STEP_COLS:
-        label = STEP_LABELS.get(col, "Total")
-        comp_data.append(
-            {
-                "Step": label,
-                "Run": str(selected_run),
-                "p50": df[col].quantile(0.5),
-                "p95": df[col].quantile(0.95),
-            }
-        )
-        comp_data.append(
-            {
-                "Step": label,
-                "Run": str(compare_run),
-                "p50": df2[col].quantile(0.5),
-                "p95": df2[col].quantile(0.95),
-            }
-        )
 
-    comp_df = __import__("pandas").DataFrame(comp_data)
-    fig_comp = px.bar(
-        comp_df,
-        x="Step",
-        y="p50",
-        color="Run",
-        barmode="group",
-        text="p50",
-        labels={"p50": "p50 (ms)"},
+# Fragment so changing the comparison run only reruns this section
+@st.fragment
+def render_comparison(run_id: int, runs: list[int], run_labels: dict) -> None:
+    """Cross-run comparison."""
+    st.divider()
+    compare_run = st.selectbox(
+        "Compare with",
+        [None] + [r for r in runs if r != run_id],
+        index=0,
+        format_func=lambda r: run_labels[r] if r else "None",
     )
-    fig_comp.update_traces(texttemplate="%{text:.0f}", textposition="outside")
-    fig_comp.update_layout(yaxis_title="p50 latency (ms)")
-    st.plotly_chart(fig_comp, width="stretch")
+    if compare_run:
+        st.subheader(f"Comparison: {run_id} vs {compare_run}")
+        quantiles = load_comparison(run_id, compare_run)
+
+        comp_items = [("Total", "total_ms")] + [(STEP_LABELS[c], c) for c in STEP_COLS]
+        comp_cols = st.columns(len(comp_items))
+        for i, (label, col) in enumerate(comp_items):
+            curr = quantiles[run_id][col]
+            prev = quantiles[compare_run][col]
+            if curr is None:
+                comp_cols[i].metric(f"{label} (p50)", "n/a")
+                continue
+            curr_med = curr[0]
+            delta_str = None
+            if prev is not None:
+                delta_str = f"{curr_med - prev[0]:+.0f}ms"
+            comp_cols[i].metric(
+                f"{label} (p50)",
+                f"{curr_med:.0f}ms",
+                delta=delta_str,
+                delta_color="inverse",
+            )
 
-# All runs trend
-if len(runs) > 1:
-    st.divider()
-    st.subheader("Trends across runs")
-    trend_data = []
-    for r in runs:
-        rdf = all_data[all_data["run_id"] == r]
-        trend_data.append(
-            {
-                "run_id": r,
-                "workers": len(rdf),
-                "pass_rate": len(rdf[rdf["status"] == "success"]) / len(rdf) * 100,
-                "p50_total": rdf["total_ms"].quantile(0.5),
-                "p95_total": rdf["total_ms"].quantile(0.95),
-                "p50_select1": rdf["select1_ms"].dropna().quantile(0.5)
-                if not rdf["select1_ms"].dropna().empty
-                else None,
-                "p95_select1": rdf["select1_ms"].dropna().quantile(0.95)
-                if not rdf["select1_ms"].dropna().empty
-                else None,
-                "p50_select3": rdf["select3_ms"].dropna().quantile(0.5)
-                if not rdf["select3_ms"].dropna().empty
-                else None,
-                "p95_select3": rdf["select3_ms"].dropna().quantile(0.95)
-                if not rdf["select3_ms"].dropna().empty
-                else None,
-            }
+        comp_data = []
+        for col in ["total_ms"] + STEP_COLS:
+            label = STEP_LABELS.get(col, "Total")
+            for r in (run_id, compare_run):
+                p50, p95 = quantiles[r][col] or (None, None)
+                comp_data.append({"Step": label, "Run": str(r), "p50": p50, "p95": p95})
+
+        comp_df = pd.DataFrame(comp_data)
+        fig_comp = px.bar(
+            comp_df,
+            x="Step",
+            y="p50",
+            color="Run",
+            barmode="group",
+            text="p50",
+            labels={"p50": "p50 (ms)"},
         )
-    trend_df = __import__("pandas").DataFrame(trend_data).sort_values("run_id")
-    trend_df["run_label"] = trend_df["run_id"].astype(str)
-
-    t1, t2 = st.columns(2)
-    with t1:
-        fig_trend = go.Figure()
-        fig_trend.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p50_total"],
-                name="p50 total",
-                mode="lines+markers",
+        fig_comp.update_traces(texttemplate="%{text:.0f}", textposition="outside")
+        fig_comp.update_layout(yaxis_title_text="p50 latency (ms)")
+        fast_plot(fig_comp)
+
+
+def render_trends(runs: list[int]) -> None:
+    """All runs trend."""
+    if len(runs) > 1:
+        st.divider()
+        st.subheader("Trends across runs")
+        trend_df = load_trends()
+        trend_df["run_label"] = trend_df["run_id"].astype(str)
+
+        t1, t2 = st.columns(2)
+        with t1:
+            fig_trend = go.Figure(_validate=False)
+            fig_trend.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p50_total"],
+                    name="p50 total",
+                    mode="lines+markers",
+                    _validate=False,
+                )
             )
-        )
-        fig_trend.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p95_total"],
-                name="p95 total",
-                mode="lines+markers",
+            fig_trend.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p95_total"],
+                    name="p95 total",
+                    mode="lines+markers",
+                    _validate=False,
+                )
             )
-        )
-        fig_trend.update_layout(
-            yaxis_title="ms", xaxis_title="Run ID", title="Total latency trend"
-        )
-        st.plotly_chart(fig_trend, width="stretch")
-    with t2:
-        fig_trend2 = go.Figure()
-        fig_trend2.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p50_select1"],
-                name="p50 cold",
-                mode="lines+markers",
+            fig_trend.update_layout(
+                yaxis_title_text="ms",
+                xaxis_title_text="Run ID",
+                title_text="Total latency trend",
             )
-        )
-        fig_trend2.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p50_select3"],
-                name="p50 hot",
-                mode="lines+markers",
+            fast_plot(fig_trend)
+        with t2:
+            fig_trend2 = go.Figure(_validate=False)
+            fig_trend2.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p50_select1"],
+                    name="p50 cold",
+                    mode="lines+markers",
+                    _validate=False,
+                )
             )
-        )
-        fig_trend2.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p95_select1"],
-                name="p95 cold",
-                mode="lines+markers",
-                line=dict(dash="dot"),
+            fig_trend2.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p50_select3"],
+                    name="p50 hot",
+                    mode="lines+markers",
+                    _validate=False,
+                )
             )
-        )
-        fig_trend2.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["p95_select3"],
-                name="p95 hot",
-                mode="lines+markers",
-                line=dict(dash="dot"),
+            fig_trend2.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p95_select1"],
+                    name="p95 cold",
+                    mode="lines+markers",
+                    line=dict(dash="dot"),
+                    _validate=False,
+                )
             )
-        )
-        fig_trend2.add_trace(
-            go.Scatter(
-                x=trend_df["run_label"],
-                y=trend_df["pass_rate"],
-                name="Pass %",
-                mode="lines+markers",
-                yaxis="y2",
+            fig_trend2.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["p95_select3"],
+                    name="p95 hot",
+                    mode="lines+markers",
+                    line=dict(dash="dot"),
+                    _validate=False,
+                )
             )
-        )
-        fig_trend2.update_layout(
-            yaxis_title="ms",
-            yaxis2=dict(title="Pass %", overlaying="y", side="right", range=[0, 105]),
-            xaxis_title="Run ID",
-            title="SELECT cold vs hot latency + pass rate trend",
-        )
-        st.plotly_chart(fig_trend2, width="stretch")
+            fig_trend2.add_trace(
+                go.Scatter(
+                    x=trend_df["run_label"],
+                    y=trend_df["pass_rate"],
+                    name="Pass %",
+                    mode="lines+markers",
+                    yaxis="y2",
+                    _validate=False,
+                )
+            )
+            fig_trend2.update_layout(
+                yaxis_title_text="ms",
+                yaxis2=dict(
+                    title=dict(text="Pass %"),
+                    overlaying="y",
+                    side="right",
+                    range=[0, 105],
+                ),
+                xaxis_title_text="Run ID",
+                title_text="SELECT cold vs hot latency + pass rate trend",
+            )
+            fast_plot(fig_trend2)
+
+
+try:
+    sync_logs_cache()
+    run_counts = load_runs()
+except Exception as e:
+    st.error(f"No data found. Run `./test-scale.sh` first.\n\n{e}")
+    st.stop()
+
+if not run_counts:
+    st.warning("No log files found in ./logs/")
+    st.stop()
+
+# Sidebar: run picker
+runs = [r for r, _ in run_counts]
+run_labels = {r: f"{r} ({n} workers)" for r, n in run_counts}
+
+st.sidebar.header("Run selection")
+selected_run = st.sidebar.selectbox(
+    "Run",
+    runs,
+    index=0,
+    format_func=lambda r: run_labels[r],
+)
+
+df = load_run(selected_run)
+failed_df = load_failures(selected_run)
+render_summary(selected_run, df)
+render_percentiles(selected_run)
+render_outcome(df, failed_df)
+render_latency_charts(selected_run, df)
+render_step_breakdown(selected_run, len(df))
+render_failures(failed_df)
+render_comparison(selected_run, runs, run_labels)
+render_trends(runs)